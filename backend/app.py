@@ -1,8 +1,10 @@
 import os
+import io
 import sys
 import json
 import pytesseract
 from pdf2image import convert_from_path
+from PIL import Image
 from fastapi import FastAPI, UploadFile, File, HTTPException, Form
 from fastapi.responses import FileResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
@@ -19,9 +21,14 @@ import platform
 import pandas as pd
 import asyncio
 import base64
+import functools
 import hashlib
 import redis
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+# Load environment variables from .env file (once, before any configuration is read)
+load_dotenv()
 
 # Initialize Redis client for caching
 redis_client = None
@@ -81,9 +88,6 @@ except ImportError:
     TALLY_AVAILABLE = False
     print("WARNING: Tally integration not available. Install required dependencies if needed.")
 
-# Load environment variables from .env file
-load_dotenv()
-
 # Configure Tesseract path for Windows (if needed)
 tesseract_cmd = os.getenv("TESSERACT_CMD")
 if tesseract_cmd:
@@ -116,7 +120,9 @@ gemini_api_key_available = False
 
 if vertexai_project and vertexai_project != "your-gcp-project-id":
     try:
-        vertexai.init(project=vertexai_project, location=vertexai_location)
+        # REST rather than the default gRPC transport: the Celery orchestrator runs on an
+        # eventlet pool, and gRPC's C-core I/O is not green, so one call would block them all
+        vertexai.init(project=vertexai_project, location=vertexai_location, api_transport="rest")
         vertexai_client = GenerativeModel(vertexai_model_name)
         print(f"✓ Vertex AI initialized: project={vertexai_project}, location={vertexai_location}, model={vertexai_model_name}")
     except Exception as e:
@@ -192,7 +198,8 @@ def generate_content_with_vertexai(prompt: str, require_json: bool = False, max_
     # If using Gemini API fallback
     if not vertexai_client and gemini_api_key_available:
         import google.generativeai as genai
-        genai.configure(api_key=gemini_api_key)
+        # REST for the same reason as vertexai.init above (eventlet-friendly sockets)
+        genai.configure(api_key=gemini_api_key, transport="rest")
         
         # Add JSON instruction if required
         if require_json:
@@ -295,7 +302,7 @@ def generate_content_with_vertexai(prompt: str, require_json: bool = False, max_
                     # Fallback to Gemini API
                     try:
                         import google.generativeai as genai
-                        genai.configure(api_key=gemini_api_key)
+                        genai.configure(api_key=gemini_api_key, transport="rest")
                         
                         # Add JSON instruction if required
                         if require_json:
@@ -374,7 +381,7 @@ def generate_content_with_vertexai(prompt: str, require_json: bool = False, max_
                         print(f"🔄 Vertex AI rate limited, falling back to Gemini API...")
                         try:
                             import google.generativeai as genai
-                            genai.configure(api_key=gemini_api_key)
+                            genai.configure(api_key=gemini_api_key, transport="rest")
                             
                             if require_json:
                                 fallback_prompt = f"{prompt}\n\nIMPORTANT: Return ONLY valid JSON. Do not include markdown formatting, code blocks, or any explanations."
@@ -420,7 +427,7 @@ def generate_content_with_vertexai(prompt: str, require_json: bool = False, max_
                         print(f"🔄 Vertex AI failed after retries, falling back to Gemini API...")
                         try:
                             import google.generativeai as genai
-                            genai.configure(api_key=gemini_api_key)
+                            genai.configure(api_key=gemini_api_key, transport="rest")
                             
                             if require_json:
                                 fallback_prompt = f"{prompt}\n\nIMPORTANT: Return ONLY valid JSON. Do not include markdown formatting, code blocks, or any explanations."
@@ -461,7 +468,7 @@ def generate_content_with_vertexai(prompt: str, require_json: bool = False, max_
         print(f"🔄 Vertex AI failed after all retries, falling back to Gemini API...")
         try:
             import google.generativeai as genai
-            genai.configure(api_key=gemini_api_key)
+            genai.configure(api_key=gemini_api_key, transport="rest")
             
             if require_json:
                 fallback_prompt = f"{prompt}\n\nIMPORTANT: Return ONLY valid JSON. Do not include markdown formatting, code blocks, or any explanations."
@@ -537,8 +544,48 @@ async def log_requests(request, call_next):
 # OCR HELPERS
 # ------------------------------
 
+@functools.lru_cache(maxsize=1)
+def _page_pool():
+    """
+    Thread pool for per-page OCR, created once per process and shared across requests/tasks
+    
+    Each prefork worker child gets its own pool, so the default splits the CPUs
+    between the children instead of giving every child a full set of threads.
+    OCR_PAGE_WORKERS overrides the computed size.
+    """
+    # Set by the worker_init handler in celery_app; 1 outside a Celery worker (API process)
+    worker_concurrency = max(1, int(os.getenv("CELERY_WORKER_CONCURRENCY", "1")))
+    max_workers = int(os.getenv("OCR_PAGE_WORKERS", max(1, (os.cpu_count() or 4) // worker_concurrency)))
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ocr-page")
+
+def _ensure_tesseract_configured():
+    """Make sure pytesseract knows where the tesseract binary is"""
+    if not pytesseract.pytesseract.tesseract_cmd:
+        tesseract_cmd = os.getenv("TESSERACT_CMD")
+        if tesseract_cmd:
+            pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+        else:
+            raise HTTPException(
+                status_code=500,
+                detail="Tesseract OCR is not configured. Please set TESSERACT_CMD in your .env file."
+            )
+
+def _ocr_page(page):
+    """OCR a single rendered PDF page, returning (text, error message)"""
+    try:
+        return pytesseract.image_to_string(page), None
+    except Exception as tesseract_error:
+        return "", str(tesseract_error)
+
 def extract_text_from_pdf(file_path):
     """Extract text from PDF using OCR"""
+    return _extract_text_from_pdf(file_path, parallel=False)
+
+def extract_text_from_pdf_parallel(file_path):
+    """Extract text from PDF using OCR, processing pages concurrently on a bounded thread pool"""
+    return _extract_text_from_pdf(file_path, parallel=True)
+
+def _extract_text_from_pdf(file_path, parallel=False):
     try:
         # Try to get poppler path from environment
         poppler_path = os.getenv("POPPLER_PATH")
@@ -585,33 +632,23 @@ def extract_text_from_pdf(file_path):
             # Try default (assumes poppler is in PATH)
             pages = convert_from_path(file_path)
         
+        _ensure_tesseract_configured()
+        
+        # OCR pages on the shared thread pool when requested; pytesseract shells out
+        # to the tesseract binary, so page OCR overlaps without holding the GIL
+        ocr_map = _page_pool().map if parallel else map
+        
         text = ""
         tesseract_errors = []
-        for i, page in enumerate(pages):
-            try:
-                # Verify Tesseract is configured
-                if not pytesseract.pytesseract.tesseract_cmd:
-                    tesseract_cmd = os.getenv("TESSERACT_CMD")
-                    if tesseract_cmd:
-                        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
-                    else:
-                        raise HTTPException(
-                            status_code=500,
-                            detail="Tesseract OCR is not configured. Please set TESSERACT_CMD in your .env file."
-                        )
-                
-                page_text = pytesseract.image_to_string(page)
-                if page_text.strip():
-                    text += page_text
-                else:
-                    print(f"Warning: Page {i+1} returned empty text from OCR")
-            except HTTPException:
-                raise
-            except Exception as tesseract_error:
-                error_msg = str(tesseract_error)
-                tesseract_errors.append(f"Page {i+1}: {error_msg}")
-                print(f"Warning: Tesseract OCR failed for page {i+1}: {error_msg}")
+        for i, (page_text, tesseract_error) in enumerate(ocr_map(_ocr_page, pages)):
+            if tesseract_error:
+                tesseract_errors.append(f"Page {i+1}: {tesseract_error}")
+                print(f"Warning: Tesseract OCR failed for page {i+1}: {tesseract_error}")
                 # Continue processing other pages
+            elif page_text.strip():
+                text += page_text
+            else:
+                print(f"Warning: Page {i+1} returned empty text from OCR")
         
         if not text.strip():
             error_detail = "No text could be extracted from the PDF."
@@ -690,6 +727,10 @@ def extract_data_from_excel(file_path):
             "error": str(e)
         }
 
+def extract_data_from_excel_bytes(data: bytes):
+    """Extract data from in-memory Excel bytes"""
+    return extract_data_from_excel(io.BytesIO(data))
+
 def extract_text_from_image(file_path):
     """Extract text from image using OCR"""
     try:
@@ -697,6 +738,13 @@ def extract_text_from_image(file_path):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error extracting text from image: {str(e)}")
 
+def extract_text_from_image_bytes(data: bytes):
+    """Extract text from in-memory image bytes using OCR"""
+    try:
+        return pytesseract.image_to_string(Image.open(io.BytesIO(data)))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error extracting text from image: {str(e)}")
+
 def extract_text_from_docx(file_path):
     """Extract text from DOCX file"""
     try:
@@ -738,6 +786,10 @@ def extract_text_from_docx(file_path):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error extracting text from DOCX: {str(e)}")
 
+def extract_text_from_docx_bytes(data: bytes):
+    """Extract text from in-memory DOCX bytes"""
+    return extract_text_from_docx(io.BytesIO(data))
+
 # ------------------------------
 # DOCUMENT TYPE CLASSIFIER
 # ------------------------------
@@ -2791,10 +2843,12 @@ async def process_file(
         
         print(f"✓ File validation passed: {filename} ({total_size / (1024*1024):.2f}MB, {file_extension})")
         
+        # Hash the upload once; the same key is used for the cache read and write below
+        doc_cache_key = get_document_cache_key(content, document_type)
+        
         # Check cache for complete document processing result
         if REDIS_AVAILABLE and redis_client:
             try:
-                doc_cache_key = get_document_cache_key(content, document_type)
                 cached_result = redis_client.get(doc_cache_key)
                 if cached_result:
                     print(f"✓ CACHE HIT: Returning cached result for document (key: {doc_cache_key[:30]}...)")
@@ -2883,7 +2937,6 @@ async def process_file(
         # Cache the complete result if Redis is available
         if REDIS_AVAILABLE and redis_client:
             try:
-                doc_cache_key = get_document_cache_key(content, document_type)
                 # Cache for 7 days (604800 seconds) - documents rarely change
                 redis_client.setex(doc_cache_key, 604800, json.dumps(result))
                 print(f"✓ Cached complete document result (key: {doc_cache_key[:30]}..., TTL: 7 days)")
@@ -3171,6 +3224,8 @@ async def cache_stats():
         # Get cache keys count for different cache types
         ai_cache_keys = redis_client.keys("gemini_cache:*")
         document_cache_keys = redis_client.keys("document_cache:*")
+        # Background task results; large ones are split into ":part:" keys, count each result once
+        document_cache_keys += [k for k in redis_client.keys("document_result:*") if ":part:" not in k]
         ai_cache_count = len(ai_cache_keys)
         document_cache_count = len(document_cache_keys)
         total_cache_count = ai_cache_count + document_cache_count
@@ -3382,15 +3437,22 @@ async def clear_cache():
     
     try:
         ai_cache_keys = redis_client.keys("gemini_cache:*")
-        document_cache_keys = redis_client.keys("document_cache:*")
-        all_cache_keys = ai_cache_keys + document_cache_keys
-        if all_cache_keys:
-            redis_client.delete(*all_cache_keys)
+        document_cache_keys = redis_client.keys("document_cache:*") + redis_client.keys("document_result:*")
+        # Extracted text / detected type kept by the background task between runs
+        intermediate_keys = redis_client.keys("document_text:*") + redis_client.keys("document_type:*")
+        # Large task values are split into ":part:" keys; delete them, but count each entry once (as /cache/stats does)
+        part_keys = [k for k in document_cache_keys + intermediate_keys if ":part:" in k]
+        document_cache_keys = [k for k in document_cache_keys if ":part:" not in k]
+        intermediate_keys = [k for k in intermediate_keys if ":part:" not in k]
+        all_cache_keys = ai_cache_keys + document_cache_keys + intermediate_keys
+        if all_cache_keys or part_keys:
+            redis_client.delete(*all_cache_keys, *part_keys)
         return {
             "status": "success",
             "cleared_entries": {
                 "ai_responses": len(ai_cache_keys),
                 "document_results": len(document_cache_keys),
+                "intermediates": len(intermediate_keys),
                 "total": len(all_cache_keys)
             }
         }
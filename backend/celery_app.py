@@ -2,7 +2,9 @@
 Celery configuration for async job processing
 """
 import os
+import redis
 from celery import Celery
+from celery.signals import worker_init
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -21,26 +23,66 @@ celery_app = Celery(
 # Celery configuration
 celery_app.conf.update(
     task_serializer="json",
-    accept_content=["json"],
-    result_serializer="json",
+    accept_content=["json", "msgpack"],
+    result_serializer="msgpack",  # Results carry full extraction + report payloads; msgpack is smaller and faster
     timezone="UTC",
     enable_utc=True,
     task_track_started=True,
     task_time_limit=30 * 60,  # 30 minutes max per task
     task_soft_time_limit=25 * 60,  # 25 minutes soft limit
     worker_prefetch_multiplier=1,  # Process one task at a time for better resource management
-    worker_max_tasks_per_child=50,  # Restart worker after 50 tasks to prevent memory leaks
+    worker_max_tasks_per_child=250,  # Restart worker after 250 tasks to prevent memory leaks
+    worker_max_memory_per_child=500_000,  # ...or sooner once a child exceeds ~500 MB RSS (value in KB)
     task_acks_late=True,  # Acknowledge tasks only after completion
     task_reject_on_worker_lost=True,  # Re-queue tasks if worker dies
     result_expires=3600,  # Results expire after 1 hour
     task_routes={
         "tasks.document_processing.*": {"queue": "document_processing"},
-        "tasks.document_processing.process_document_task": {"queue": "document_processing"},
+        # Orchestrators and LLM-bound work run on the eventlet pool (see start_celery_worker.sh)
+        "tasks.document_processing.process_document_task": {"queue": "document_network"},
+        "tasks.document_processing.process_gst_files_task": {"queue": "document_network"},
+        "tasks.document_processing.process_audit_files_task": {"queue": "document_network"},
+        "tasks.document_processing.aggregate_gst_reports": {"queue": "document_network"},
+        "tasks.document_processing.aggregate_audit_reports": {"queue": "document_network"},
+        # CPU-bound OCR/PDF/Excel extraction runs on the prefork pool
+        "tasks.document_processing._extract_text_heavy": {"queue": "heavy"},
+        "tasks.document_processing.extract_gst_file_task": {"queue": "heavy"},
+        "tasks.document_processing.extract_audit_file_task": {"queue": "heavy"},
     },
     task_default_queue="document_processing",
     task_default_exchange="document_processing",
     task_default_routing_key="document_processing",
+    worker_redirect_stdouts=False,  # Tasks log through `logging`; don't proxy stdout through the logger
+    broker_pool_limit=10,  # Reuse broker connections instead of opening one per publish
+    broker_transport_options={
+        "max_connections": 50,
+        "socket_keepalive": True,
+        "health_check_interval": 60,
+        "retry_on_timeout": True,
+    },
+)
+
+# Shared Redis client for task-side caching.
+# The pool is created once at import time so every task in a worker process
+# reuses the same connections instead of reconnecting per document.
+# Responses are left as bytes because cached results are stored compressed.
+_redis_pool = redis.ConnectionPool.from_url(
+    redis_url,
+    max_connections=50,
+    socket_keepalive=True,
+    health_check_interval=60,
+    decode_responses=False,
 )
+redis_client = redis.Redis(connection_pool=_redis_pool)
+
+
+@worker_init.connect
+def _export_worker_concurrency(sender=None, **kwargs):
+    """
+    Publish the pool size to the environment before the pool forks, so code that
+    does not import celery (app._page_pool) can split the CPUs between children
+    """
+    os.environ["CELERY_WORKER_CONCURRENCY"] = str(sender.concurrency)
 
 # Tasks will be imported when needed to avoid circular imports
 
@@ -27,7 +27,8 @@ def get_vertexai_client():
         if not project_id:
             raise ValueError("VERTEXAI_PROJECT_ID environment variable is not set. Please add it to your .env file.")
         
-        vertexai.init(project=project_id, location=location)
+        # REST transport so LLM calls yield under the eventlet worker pool (gRPC would block it)
+        vertexai.init(project=project_id, location=location, api_transport="rest")
         _client = GenerativeModel(model_name)
     return _client
 
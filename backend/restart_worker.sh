@@ -1,12 +1,18 @@
 #!/bin/bash
-# Restart Celery worker
+# Restart Celery workers
 
 echo "Stopping existing Celery workers..."
+pkill -f "celery.*worker.*--queues=heavy" || true
+pkill -f "celery.*worker.*--queues=document_network" || true
+# Single worker started by earlier versions of this script (--queues=document_processing)
 pkill -f "celery.*worker.*document_processing" || true
 sleep 2
 
-echo "Starting Celery worker..."
+echo "Starting Celery workers..."
 cd "$(dirname "$0")"
 source venv/bin/activate
-celery -A celery_app worker --loglevel=info --concurrency=2 --queues=document_processing --hostname=worker@%h
-
+# Network worker runs in the background but keeps logging to this terminal; stopped when this script exits
+celery -A celery_app worker --loglevel=info --pool=eventlet --concurrency=32 --queues=document_network --hostname=network@%h &
+NETWORK_WORKER_PID=$!
+trap 'kill $NETWORK_WORKER_PID 2>/dev/null' EXIT
+celery -A celery_app worker --loglevel=info --pool=prefork --concurrency=$(nproc 2>/dev/null || sysctl -n hw.ncpu) --queues=heavy,document_processing --hostname=worker@%h
@@ -1,7 +1,7 @@
 #!/bin/bash
-# Script to start Celery worker for document processing
+# Script to start Celery workers for document processing
 
-echo "Starting Celery worker for document processing..."
+echo "Starting Celery workers for document processing..."
 echo "Make sure Redis is running: redis-server"
 
 # Activate virtual environment if it exists
@@ -9,10 +9,20 @@ if [ -d "venv" ]; then
     source venv/bin/activate
 fi
 
-# Start Celery worker
+# Network-bound worker: task orchestration and LLM classification/extraction/report calls on green threads
 celery -A celery_app worker \
     --loglevel=info \
-    --concurrency=2 \
-    --queues=document_processing \
-    --hostname=worker@%h
+    --pool=eventlet \
+    --concurrency=32 \
+    --queues=document_network \
+    --hostname=network@%h &
+NETWORK_WORKER_PID=$!
+trap 'kill $NETWORK_WORKER_PID 2>/dev/null' EXIT
 
+# CPU-bound worker: OCR/PDF/Excel text extraction, one process per core
+celery -A celery_app worker \
+    --loglevel=info \
+    --pool=prefork \
+    --concurrency=$(nproc 2>/dev/null || sysctl -n hw.ncpu) \
+    --queues=heavy,document_processing \
+    --hostname=worker@%h
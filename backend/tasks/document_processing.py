@@ -2,25 +2,388 @@
 Background tasks for document processing using Celery
 """
 import os
-import json
 import tempfile
-from celery import Task
-from celery_app import celery_app
+import functools
+from types import SimpleNamespace
+from celery import Task, chord, group
+from celery.exceptions import TimeoutError as CeleryTimeoutError
+from celery_app import celery_app, redis_client
 from typing import Dict, List, Optional
 import base64
+import gzip
+import hashlib
+import logging
+import math
+import re
+import time
+import orjson
+
+logger = logging.getLogger(__name__)
+
+# Scratch directory for files that must exist on disk (PDF OCR). Prefer tmpfs so
+# poppler/tesseract re-reads hit RAM instead of the block device
+TMP_DIR = os.getenv("FINSIGHT_TMPDIR", "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir())
 
 # Import processing functions - using lazy imports to avoid circular dependencies
-# These will be imported when the task runs, not at module load time
+# These are imported on the first task run (see _extractors), not at module load time
+
+# Cache TTLs (seconds) per document type: finalized documents such as bank
+# statements and invoices rarely change, drafts and filings in progress do
+CACHE_TTL = {
+    "bank_statement": 30 * 86400,
+    "invoice": 30 * 86400,
+    "purchase_order": 30 * 86400,
+    "balance_sheet": 14 * 86400,
+    "profit_loss": 14 * 86400,
+    "trial_balance": 7 * 86400,
+    "salary_slip": 7 * 86400,
+    "agreement_contract": 7 * 86400,
+    "gst_return": 3 * 86400,
+    "audit_papers": 1 * 86400,
+}
+DEFAULT_TTL = 86400
+
+# Minimum TTL (seconds) for intermediate artifacts (extracted text, detected type). They are
+# keyed by file hash only and otherwise live as long as the final result for that type, so
+# re-processing with a different type hint can skip OCR and classification
+INTERMEDIATE_TTL = 86400
+
+# Final results stay in Redis this many times longer than their TTL. Past the TTL an entry
+# is no longer served as a hit, but is returned (flagged stale) if reprocessing fails
+STALE_TTL_FACTOR = 2
+
+# Seconds the orchestrator waits for text from the heavy queue. The eventlet pool does not
+# enforce task_time_limit/task_soft_time_limit, so this is the only bound on that wait
+HEAVY_RESULT_TIMEOUT = celery_app.conf.task_soft_time_limit
+
+# Minimum seconds between intermediate progress updates written to the result backend
+PROGRESS_INTERVAL = 2.0
+
+# Extra TTL granted per second spent producing a result, so expensive documents stay cached longer
+TTL_BUFFER_PER_SECOND = 5
+
+# Cached payloads larger than this are gzip-compressed before being stored
+CACHE_COMPRESS_THRESHOLD = 4096
+
+
+def _pack(obj) -> bytes:
+    """Serialize a result for Redis, gzip-compressing large payloads behind a 2-byte tag"""
+    blob = orjson.dumps(obj)
+    if len(blob) > CACHE_COMPRESS_THRESHOLD:
+        return b"GZ" + gzip.compress(blob, compresslevel=3)
+    return b"RW" + blob
+
+
+def _unpack(blob: bytes):
+    """Inverse of _pack; every value under the task's cache keys carries a GZ/RW tag"""
+    tag, payload = blob[:2], blob[2:]
+    if tag == b"GZ":
+        return orjson.loads(gzip.decompress(payload))
+    if tag == b"RW":
+        return orjson.loads(payload)
+    raise ValueError(f"Unrecognised cache value tag: {tag!r}")
+
+
+# Values larger than this are split into parts of this size; ~1 MiB is the
+# throughput sweet spot for single Redis values
+CACHE_CHUNK_SIZE = 1024 * 1024
+
+
+def _setex_chunked(pipe, key: str, ttl: int, blob: bytes) -> None:
+    """
+    Queue a SETEX on the pipeline, splitting oversize values into numbered parts
+    
+    The key itself then holds a small "CH"-tagged manifest, so a plain GET/MGET
+    of the key still tells the reader whether the value is chunked.
+    """
+    if len(blob) <= CACHE_CHUNK_SIZE:
+        pipe.setex(key, ttl, blob)
+        return
+    n = math.ceil(len(blob) / CACHE_CHUNK_SIZE)
+    for i in range(n):
+        pipe.setex(f"{key}:part:{i}", ttl, blob[i * CACHE_CHUNK_SIZE:(i + 1) * CACHE_CHUNK_SIZE])
+    # Manifest goes last so readers never see it before the parts exist
+    pipe.setex(key, ttl, b"CH" + orjson.dumps({"n": n, "len": len(blob)}))
+
+
+def _resolve_chunked(key: str, value: Optional[bytes]) -> Optional[bytes]:
+    """Reassemble a value written by _setex_chunked, fetching all parts in one MGET"""
+    if not value or value[:2] != b"CH":
+        return value
+    manifest = orjson.loads(value[2:])
+    parts = redis_client.mget([f"{key}:part:{i}" for i in range(manifest["n"])])
+    if any(part is None for part in parts):
+        # A part expired or was evicted; treat the whole value as a miss
+        return None
+    blob = b"".join(parts)
+    return blob if len(blob) == manifest["len"] else None
+
+
+# Keyword fallback used when the document type is missing or not recognised.
+# Group names are the document types; a single case-insensitive scan returns
+# the earliest keyword in the text without materializing a lowercase copy
+_CLASS_RE = re.compile(
+    r"(?P<bank_statement>\bbank)"
+    r"|(?P<gst_return>\bgst)"
+    r"|(?P<profit_loss>\bprofit[\s\S]{0,40}?loss)"
+    r"|(?P<salary_slip>\bsalar(?:y|ies))",
+    re.IGNORECASE,
+)
+
+
+@functools.lru_cache(maxsize=1)
+def _extractors() -> SimpleNamespace:
+    """
+    Resolve the processing functions once per worker process
+    
+    The first task pays for importing app/report_generators; later tasks in the
+    same worker reuse the cached namespace, including the document type ->
+    extractor / report generator lookup tables.
+    """
+    from app import (
+        extract_text_from_pdf_parallel,
+        extract_text_from_docx_bytes,
+        extract_text_from_image_bytes,
+        extract_data_from_excel_bytes,
+        classify_document,
+        extract_bank_statement_structured,
+        extract_gst_return,
+        extract_trial_balance,
+        extract_profit_loss,
+        extract_invoice,
+        extract_purchase_order,
+        extract_salary_slip,
+        extract_balance_sheet,
+        extract_audit_papers,
+        extract_agreement_contract
+    )
+    from report_generators import (
+        generate_bank_statement_reports,
+        generate_gst_return_reports,
+        generate_invoice_reports,
+        generate_purchase_order_reports,
+        generate_salary_slip_reports,
+        generate_profit_loss_reports,
+        generate_trial_balance_reports,
+        generate_balance_sheet_reports,
+        generate_audit_papers_reports,
+        generate_agreement_contract_reports,
+        generate_gst_reports_from_excel,
+        generate_comprehensive_audit_report
+    )
+    
+    return SimpleNamespace(
+        extract_text_from_pdf_parallel=extract_text_from_pdf_parallel,
+        extract_text_from_docx_bytes=extract_text_from_docx_bytes,
+        extract_text_from_image_bytes=extract_text_from_image_bytes,
+        extract_data_from_excel_bytes=extract_data_from_excel_bytes,
+        classify_document=classify_document,
+        generate_gst_reports_from_excel=generate_gst_reports_from_excel,
+        generate_comprehensive_audit_report=generate_comprehensive_audit_report,
+        EXTRACTORS={
+            "bank_statement": extract_bank_statement_structured,
+            "gst_return": extract_gst_return,
+            "trial_balance": extract_trial_balance,
+            "profit_loss": extract_profit_loss,
+            "invoice": extract_invoice,
+            "purchase_order": extract_purchase_order,
+            "salary_slip": extract_salary_slip,
+            "balance_sheet": extract_balance_sheet,
+            "audit_papers": extract_audit_papers,
+            "agreement_contract": extract_agreement_contract,
+        },
+        REPORTS={
+            "bank_statement": generate_bank_statement_reports,
+            "gst_return": generate_gst_return_reports,
+            "trial_balance": generate_trial_balance_reports,
+            "profit_loss": generate_profit_loss_reports,
+            "invoice": generate_invoice_reports,
+            "purchase_order": generate_purchase_order_reports,
+            "salary_slip": generate_salary_slip_reports,
+            "balance_sheet": generate_balance_sheet_reports,
+            "audit_papers": generate_audit_papers_reports,
+            "agreement_contract": generate_agreement_contract_reports,
+        },
+    )
+
+
+def _detect_document_type(text: str) -> Optional[str]:
+    """Guess the document type from keywords in a single regex pass over the text"""
+    m = _CLASS_RE.search(text)
+    return m.lastgroup if m else None
+
+
+def _has_error(payload) -> bool:
+    """True if a report payload, or any single report inside it, carries an "error" marker"""
+    if not isinstance(payload, dict):
+        return False
+    return "error" in payload or any(isinstance(v, dict) and "error" in v for v in payload.values())
+
+
+def _pdf_text(file_content: bytes, task_id: str) -> str:
+    """OCR a PDF; poppler converts from a path, so this is the one extractor that needs a temp file"""
+    log_ctx = {'task_id': task_id, 'stage': 'extract'}
+    
+    with tempfile.NamedTemporaryFile(dir=TMP_DIR, prefix=f"finsight_{task_id}_", suffix=".pdf", delete=False) as temp:
+        temp.write(file_content)
+        temp_file_path = temp.name
+    
+    logger.debug("File saved to: %s", temp_file_path, extra=log_ctx)
+    try:
+        return _extractors().extract_text_from_pdf_parallel(temp_file_path)
+    finally:
+        # Clean up temporary file
+        try:
+            os.unlink(temp_file_path)
+            logger.debug("Cleaned up temporary file: %s", temp_file_path, extra=log_ctx)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning("Could not delete temporary file: %s", e, extra=log_ctx)
+
+
+def _docx_text(file_content: bytes, task_id: str) -> str:
+    return _extractors().extract_text_from_docx_bytes(file_content)
+
+
+def _image_text(file_content: bytes, task_id: str) -> str:
+    return _extractors().extract_text_from_image_bytes(file_content)
+
+
+def _excel_text(file_content: bytes, task_id: str) -> str:
+    # For now, convert Excel files to their text representation
+    return _extractors().extract_data_from_excel_bytes(file_content).get("summary_text", "")
+
+
+def _plain_text(file_content: bytes, task_id: str) -> str:
+    return file_content.decode("utf-8")
+
+
+# File extension -> text extractor; anything else is read as a UTF-8 text file
+SUFFIX_DISPATCH = {
+    ".pdf": _pdf_text,
+    ".docx": _docx_text,
+    ".doc": _docx_text,
+    ".jpg": _image_text,
+    ".jpeg": _image_text,
+    ".png": _image_text,
+    ".xlsx": _excel_text,
+    ".xls": _excel_text,
+}
+
+
+def _extract_text(file_content: bytes, filename: str, task_id: str) -> str:
+    """Extract text from decoded file content, dispatching on the filename extension"""
+    ext = os.path.splitext(filename)[1].lower()
+    return SUFFIX_DISPATCH.get(ext, _plain_text)(file_content, task_id)
+
+
+def _analyze_document(text: str, document_type: Optional[str], task_id: str) -> Dict:
+    """
+    Classify a document and extract structured data and reports from its text
+    
+    Every step is dominated by LLM API round-trips, so this runs inline in the
+    eventlet-pooled orchestrator rather than on the CPU workers.
+    
+    Args:
+        text: Text already extracted from the document
+        document_type: Optional normalized document type hint
+        task_id: Id of the calling task, for logging
+    
+    Returns:
+        Dict with document_type, extracted_data and reports, plus a "classified" flag
+        that is True only when document_type came from a successful classify_document call
+        and a "reports_ok" flag that is False when extraction or report generation degraded
+    """
+    # Lazy import to avoid circular dependencies (cached per worker)
+    ex = _extractors()
+    classified = False
+    
+    # Classify document if type not provided
+    if not document_type:
+        try:
+            detected = ex.classify_document(text)
+            document_type = detected.get("type", "").lower().replace(" ", "_")
+            classified = document_type in ex.EXTRACTORS
+            logger.info("Detected document type: %s", document_type, extra={'task_id': task_id, 'stage': 'classify'})
+        except Exception as e:
+            logger.warning("Classification failed: %s", e, extra={'task_id': task_id, 'stage': 'classify'})
+            document_type = "unknown"
+    
+    # Fall back to keyword detection when the type is not one we have an extractor for
+    if document_type not in ex.EXTRACTORS:
+        detected_type = _detect_document_type(text)
+        if detected_type:
+            document_type = detected_type
+        else:
+            # Default to bank statement if unknown
+            logger.info("Unknown document type, defaulting to bank statement extraction", extra={'task_id': task_id, 'stage': 'classify'})
+    
+    # Extract data based on document type
+    result = ex.EXTRACTORS.get(document_type, ex.EXTRACTORS["bank_statement"])(text)
+    
+    # Generate reports
+    reports = {}
+    reports_ok = True
+    try:
+        generate_reports = ex.REPORTS.get(document_type)
+        if generate_reports:
+            reports = generate_reports(result, text)
+    except Exception as e:
+        logger.warning("Report generation failed: %s", e, extra={'task_id': task_id, 'stage': 'reports'})
+        reports = {}
+        reports_ok = False
+    
+    # The app extractors swallow their own LLM failures into {"error": ...} markers
+    if _has_error(reports) or (isinstance(result, dict) and ("error" in result or _has_error(result.get("reports")))):
+        reports_ok = False
+    
+    return {
+        "document_type": document_type,
+        "extracted_data": result,
+        "reports": reports,
+        "classified": classified,
+        "reports_ok": reports_ok
+    }
 
 
 class ProcessingTask(Task):
     """Base task class with error handling"""
     def on_failure(self, exc, task_id, args, kwargs, einfo):
-        print(f"Task {task_id} failed: {str(exc)}")
-        print(f"Error info: {einfo}")
+        logger.error("Task %s failed: %s", task_id, exc, extra={'task_id': task_id})
+        logger.debug("Error info: %s", einfo, extra={'task_id': task_id})
     
     def on_success(self, retval, task_id, args, kwargs):
-        print(f"Task {task_id} completed successfully")
+        logger.info("Task %s completed successfully", task_id, extra={'task_id': task_id})
+
+
+@celery_app.task(bind=True, base=ProcessingTask, name="tasks.document_processing._extract_text_heavy")
+def _extract_text_heavy(self, content: str, filename: str) -> str:
+    """
+    Extract text from a document on the CPU-bound prefork workers (heavy queue)
+    
+    OCR and PDF rendering would starve the green threads of the eventlet pool,
+    so the orchestrator hands them off here and waits for the text.
+    
+    Args:
+        content: Base64 encoded file content
+        filename: Original filename, used to pick the extractor
+    
+    Returns:
+        Extracted text
+    
+    Raises:
+        RuntimeError: carrying only the message of whatever the extractor raised
+    """
+    try:
+        return _extract_text(base64.b64decode(content), filename, self.request.id)
+    except Exception as e:
+        # app's extractors raise fastapi.HTTPException, whose keyword-only arguments leave
+        # exc.args empty, so the orchestrator could not rebuild it from the result backend
+        # (status and detail were lost). Re-raise with the message as the only argument.
+        if hasattr(e, "status_code") and hasattr(e, "detail"):
+            raise RuntimeError(f"{e.status_code}: {e.detail}") from e
+        raise RuntimeError(f"{type(e).__name__}: {e}") from e
 
 
 @celery_app.task(bind=True, base=ProcessingTask, name="tasks.document_processing.process_document_task")
@@ -33,162 +396,98 @@ def process_document_task(self, file_data: Dict, document_type: Optional[str] =
             - filename: str
             - content: str (base64 encoded file content)
             - mime_type: str
+            - sha256: str (optional hex digest of the decoded content; computed here if absent)
         document_type: Optional document type hint
     
     Returns:
         Dict with processing result
     """
     task_id = self.request.id
-    print(f"\n{'='*60}")
-    print(f"Starting document processing task: {task_id}")
-    print(f"Filename: {file_data.get('filename', 'unknown')}")
-    print(f"Document type: {document_type}")
-    print(f"{'='*60}\n")
+    started_at = time.monotonic()
+    # Note: 'filename' is a reserved LogRecord attribute, so the document name goes under 'document_name'
+    log_ctx = {'task_id': task_id, 'document_name': file_data.get('filename', 'unknown')}
+    logger.info("Starting document processing task (type hint: %s)", document_type, extra={**log_ctx, 'stage': 'start'})
     
-    temp_file_path = None
+    text_key = None
+    text = None
+    cached_text = cached_type = None
+    stale_result = None
     
     try:
-        # Lazy import to avoid circular dependencies
-        from app import (
-            extract_text_from_pdf,
-            extract_text_from_docx,
-            extract_text_from_image,
-            classify_document,
-            extract_bank_statement_structured,
-            extract_gst_return,
-            extract_trial_balance,
-            extract_profit_loss,
-            extract_invoice,
-            extract_purchase_order,
-            extract_salary_slip,
-            extract_balance_sheet,
-            extract_audit_papers,
-            extract_agreement_contract,
-            extract_excel_data
-        )
-        from report_generators import (
-            generate_bank_statement_reports,
-            generate_gst_return_reports,
-            generate_invoice_reports,
-            generate_purchase_order_reports,
-            generate_salary_slip_reports,
-            generate_profit_loss_reports,
-            generate_trial_balance_reports,
-            generate_balance_sheet_reports,
-            generate_audit_papers_reports,
-            generate_agreement_contract_reports
-        )
-        
-        # Update task state
-        self.update_state(state='PROCESSING', meta={'status': 'Extracting text from document...'})
-        
-        # Decode file content
+        # Decode file content once; reuse the caller's hash when provided
         file_content = base64.b64decode(file_data['content'])
-        filename = file_data['filename']
+        file_hash = file_data.get('sha256') or hashlib.sha256(file_content).hexdigest()
         
-        # Save to temporary file
-        temp_dir = tempfile.gettempdir()
-        temp_file_path = os.path.join(temp_dir, f"finsight_{task_id}_{filename}")
+        # Normalize the type hint first so "Bank Statement" and "bank_statement" share a cache entry
+        if document_type:
+            document_type = document_type.lower().replace(" ", "_").replace("-", "_")
         
-        with open(temp_file_path, "wb") as temp:
-            temp.write(file_content)
+        # Own prefix: /process stores plain JSON under document_cache:, this task stores tagged blobs
+        doc_cache_key = f"document_result:{file_hash}:{document_type or 'auto'}"
+        text_key = f"document_text:{file_hash}"
+        type_key = f"document_type:{file_hash}"
         
-        print(f"File saved to: {temp_file_path}")
+        # Look up the final result and the intermediate artifacts in one round-trip;
+        # return the cached result for identical documents before doing any extraction work
+        try:
+            cached_text, cached_type, cached = redis_client.mget([text_key, type_key, doc_cache_key])
+            cached = _resolve_chunked(doc_cache_key, cached)
+            if cached:
+                entry = _unpack(cached)
+                if time.time() < entry["fresh_until"]:
+                    logger.info("Cache hit for document", extra={**log_ctx, 'stage': 'cache'})
+                    return entry["result"]
+                # Past its TTL: reprocess, keeping the old result to fall back on
+                stale_result = entry["result"]
+        except Exception as cache_error:
+            logger.warning("Cache check error (continuing with processing): %s", cache_error, extra={**log_ctx, 'stage': 'cache'})
+        
+        filename = file_data['filename']
         
         # Extract text
         self.update_state(state='PROCESSING', meta={'status': 'Extracting text...', 'progress': 10})
+        last_progress_at = time.monotonic()
         
-        if filename.lower().endswith(".pdf"):
-            text = extract_text_from_pdf(temp_file_path)
-        elif filename.lower().endswith((".docx", ".doc")):
-            text = extract_text_from_docx(temp_file_path)
-        elif filename.lower().endswith((".jpg", ".jpeg", ".png")):
-            text = extract_text_from_image(temp_file_path)
-        elif filename.lower().endswith((".xlsx", ".xls")):
-            # Handle Excel files
-            excel_data = extract_excel_data(temp_file_path)
-            # For now, convert to text representation
-            text = excel_data.get("summary_text", "")
-        else:
-            # Try to read as text file
-            with open(temp_file_path, "r", encoding="utf-8") as f:
-                text = f.read()
-        
-        print(f"Text extracted: {len(text)} characters")
-        
-        # Normalize document type
-        if document_type:
-            document_type = document_type.lower().replace(" ", "_").replace("-", "_")
+        def _report(status: str, progress: int) -> None:
+            """Publish an intermediate progress update, at most once every PROGRESS_INTERVAL seconds"""
+            nonlocal last_progress_at
+            now = time.monotonic()
+            if now - last_progress_at >= PROGRESS_INTERVAL:
+                self.update_state(state='PROCESSING', meta={'status': status, 'progress': progress})
+                last_progress_at = now
         
-        # Classify document if type not provided
-        if not document_type:
-            self.update_state(state='PROCESSING', meta={'status': 'Classifying document type...', 'progress': 20})
+        if cached_text:
+            cached_text = _resolve_chunked(text_key, cached_text)
+        if cached_text:
+            text = _unpack(cached_text)
+            logger.info("Reusing cached extracted text", extra={**log_ctx, 'stage': 'extract', 'chars': len(text)})
+        else:
+            # Waiting on the result yields to other green threads under eventlet
+            subtask = _extract_text_heavy.apply_async(
+                args=[file_data['content'], filename],
+                queue="heavy"
+            )
             try:
-                detected = classify_document(text)
-                document_type = detected.get("type", "").lower().replace(" ", "_")
-                print(f"Detected document type: {document_type}")
-            except Exception as e:
-                print(f"Warning: Classification failed: {str(e)}")
-                document_type = "unknown"
-        
-        # Extract data based on document type
-        self.update_state(state='PROCESSING', meta={'status': 'Extracting structured data...', 'progress': 40})
+                text = subtask.get(timeout=HEAVY_RESULT_TIMEOUT, disable_sync_subtasks=False)
+            except CeleryTimeoutError:
+                # Heavy worker down, not consuming the queue or lost the message; don't leave
+                # the subtask to run later, and fail (or serve stale) below
+                subtask.revoke(terminate=True)
+                raise
+            logger.info("Text extracted", extra={**log_ctx, 'stage': 'extract', 'chars': len(text)})
         
-        result = None
-        
-        if document_type == "bank_statement" or "bank" in text.lower():
-            result = extract_bank_statement_structured(text)
-        elif document_type == "gst_return" or "gst" in text.lower():
-            result = extract_gst_return(text)
-        elif document_type == "trial_balance":
-            result = extract_trial_balance(text)
-        elif document_type == "profit_loss" or ("profit" in text.lower() and "loss" in text.lower()):
-            result = extract_profit_loss(text)
-        elif document_type == "invoice":
-            result = extract_invoice(text)
-        elif document_type == "purchase_order":
-            result = extract_purchase_order(text)
-        elif document_type == "salary_slip" or "salary" in text.lower():
-            result = extract_salary_slip(text)
-        elif document_type == "balance_sheet":
-            result = extract_balance_sheet(text)
-        elif document_type == "audit_papers":
-            result = extract_audit_papers(text)
-        elif document_type == "agreement_contract":
-            result = extract_agreement_contract(text)
-        else:
-            # Default to bank statement if unknown
-            print("Unknown document type, defaulting to bank statement extraction")
-            result = extract_bank_statement_structured(text)
+        if not document_type and cached_type:
+            # Skip classification when this content was already classified
+            document_type = _unpack(cached_type)
         
-        # Generate reports
-        self.update_state(state='PROCESSING', meta={'status': 'Generating reports...', 'progress': 70})
+        # Classification, structured extraction and report generation are LLM-bound
+        # and run right here on the eventlet pool
+        _report('Analyzing document...', 20)
+        analysis = _analyze_document(text, document_type, task_id)
         
-        reports = {}
-        try:
-            if document_type == "bank_statement":
-                reports = generate_bank_statement_reports(result, text)
-            elif document_type == "gst_return":
-                reports = generate_gst_return_reports(result, text)
-            elif document_type == "invoice":
-                reports = generate_invoice_reports(result, text)
-            elif document_type == "purchase_order":
-                reports = generate_purchase_order_reports(result, text)
-            elif document_type == "salary_slip":
-                reports = generate_salary_slip_reports(result, text)
-            elif document_type == "profit_loss":
-                reports = generate_profit_loss_reports(result, text)
-            elif document_type == "trial_balance":
-                reports = generate_trial_balance_reports(result, text)
-            elif document_type == "balance_sheet":
-                reports = generate_balance_sheet_reports(result, text)
-            elif document_type == "audit_papers":
-                reports = generate_audit_papers_reports(result, text)
-            elif document_type == "agreement_contract":
-                reports = generate_agreement_contract_reports(result, text)
-        except Exception as e:
-            print(f"Warning: Report generation failed: {str(e)}")
-            reports = {}
+        document_type = analysis["document_type"]
+        result = analysis["extracted_data"]
+        reports = analysis["reports"]
         
         # Combine result and reports
         final_result = {
@@ -198,41 +497,54 @@ def process_document_task(self, file_data: Dict, document_type: Optional[str] =
             "filename": filename
         }
         
-        # Cache the complete result if Redis is available
+        # Cache the complete result, plus any intermediate artifacts computed in this run,
+        # in a single pipelined round-trip
         try:
-            import redis
-            import os
-            from dotenv import load_dotenv
-            load_dotenv()
-            
-            redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
-            redis_client_cache = redis.from_url(redis_url, decode_responses=True)
-            
-            # Generate cache key from original file content
-            file_content = base64.b64decode(file_data['content'])
-            import hashlib
-            file_hash = hashlib.sha256(file_content).hexdigest()
-            doc_type_str = document_type or "auto"
-            doc_cache_key = f"document_cache:{file_hash}:{doc_type_str}"
-            
-            # Cache for 7 days (604800 seconds)
-            redis_client_cache.setex(doc_cache_key, 604800, json.dumps(final_result))
-            print(f"✓ Cached complete document result in task (key: {doc_cache_key[:30]}..., TTL: 7 days)")
+            ttl = CACHE_TTL.get(document_type, DEFAULT_TTL) + int((time.monotonic() - started_at) * TTL_BUFFER_PER_SECOND)
+            intermediate_ttl = max(ttl, INTERMEDIATE_TTL)
+            with redis_client.pipeline(transaction=False) as pipe:
+                if not cached_text:
+                    _setex_chunked(pipe, text_key, intermediate_ttl, _pack(text))
+                # Only remember what the classifier itself returned: caller hints and keyword
+                # guesses are not properties of the content, and a failed call is retried next time
+                if analysis["classified"]:
+                    pipe.setex(type_key, intermediate_ttl, _pack(document_type))
+                # A result degraded by a transient LLM/rate-limit error is returned but not cached,
+                # so the next request retries it instead of being served the error for weeks
+                if analysis["reports_ok"]:
+                    entry = {"fresh_until": time.time() + ttl, "result": final_result}
+                    _setex_chunked(pipe, doc_cache_key, ttl * STALE_TTL_FACTOR, _pack(entry))
+                else:
+                    logger.warning("Not caching degraded document result", extra={**log_ctx, 'stage': 'cache'})
+                pipe.execute()
+            if analysis["reports_ok"]:
+                logger.info("Cached complete document result", extra={**log_ctx, 'stage': 'cache', 'ttl': ttl})
         except Exception as cache_error:
-            print(f"Warning: Could not cache result in task: {str(cache_error)}")
-        
-        self.update_state(state='SUCCESS', meta={'status': 'Processing completed', 'progress': 100, 'result': final_result})
+            logger.warning("Could not cache result in task: %s", cache_error, extra={**log_ctx, 'stage': 'cache'})
         
+        # Returning stores the SUCCESS state and result; no separate update_state needed
         return final_result
         
     except Exception as e:
-        import traceback
-        error_trace = traceback.format_exc()
         error_msg = str(e)
         error_type = type(e).__name__
         
-        print(f"ERROR in process_document_task {task_id}: {error_type}: {error_msg}")
-        print(f"Traceback:\n{error_trace}")
+        logger.exception("Error in process_document_task: %s: %s", error_type, error_msg, extra={**log_ctx, 'stage': 'error'})
+        
+        # Keep freshly extracted text when a later (LLM) stage failed, so a retry skips OCR
+        if text is not None and not cached_text:
+            try:
+                with redis_client.pipeline(transaction=False) as pipe:
+                    _setex_chunked(pipe, text_key, INTERMEDIATE_TTL, _pack(text))
+                    pipe.execute()
+            except Exception as cache_error:
+                logger.warning("Could not cache extracted text: %s", cache_error, extra={**log_ctx, 'stage': 'cache'})
+        
+        # Serve the expired cached copy (flagged as stale) rather than failing outright
+        if stale_result is not None:
+            stale_result['stale'] = True
+            logger.warning("Returning stale cached result", extra={**log_ctx, 'stage': 'cache'})
+            return stale_result
         
         # Update state with properly formatted error info
         try:
@@ -245,7 +557,7 @@ def process_document_task(self, file_data: Dict, document_type: Optional[str] =
                 }
             )
         except Exception as update_error:
-            print(f"Failed to update task state: {str(update_error)}")
+            logger.error("Failed to update task state: %s", update_error, extra=log_ctx)
         
         # Return error result instead of raising to avoid serialization issues
         return {
@@ -254,15 +566,126 @@ def process_document_task(self, file_data: Dict, document_type: Optional[str] =
             'error_type': error_type,
             'result': None
         }
+
+
+def _gst_file_type(filename: str) -> str:
+    """Map a GST upload to its role (mirrors the /process-gst endpoint)"""
+    filename_lower = filename.lower()
+    if "gstr" in filename_lower or "2b" in filename_lower or "summary" in filename_lower:
+        return "gstr2b_summary"
+    elif "purchase" in filename_lower or "register" in filename_lower:
+        return "purchase_register"
+    elif "vendor" in filename_lower or "master" in filename_lower:
+        return "vendor_master"
+    return "unknown"
+
+
+def _audit_doc_type(filename: str) -> str:
+    """Map an audit upload to its document type from the filename (mirrors the /process-audit endpoint)"""
+    filename_lower = filename.lower()
+    if "trial" in filename_lower or ("balance" in filename_lower and "sheet" not in filename_lower):
+        return "trial_balance"
+    elif "profit" in filename_lower or "loss" in filename_lower or "p&l" in filename_lower or "p_l" in filename_lower:
+        return "profit_loss"
+    elif "balance" in filename_lower and "sheet" in filename_lower:
+        return "balance_sheet"
+    elif "ledger" in filename_lower:
+        return "general_ledger"
+    elif "cash" in filename_lower:
+        return "cash_book"
+    elif "bank" in filename_lower:
+        return "bank_statement"
+    elif "asset" in filename_lower or "fixed" in filename_lower:
+        return "fixed_asset_register"
+    elif "gst" in filename_lower:
+        return "gst_returns"
+    elif "tds" in filename_lower:
+        return "tds_summary"
+    return "unknown"
+
+
+@celery_app.task(bind=True, base=ProcessingTask, name="tasks.document_processing.extract_gst_file_task")
+def extract_gst_file_task(self, file_data: Dict) -> Dict:
+    """
+    Extract sheet data from a single GST Excel file (chord header for process_gst_files_task)
+    
+    Args:
+        file_data: File dictionary (same format as process_document_task)
+    
+    Returns:
+        Dict with file_type and excel_data
+    """
+    filename = file_data['filename']
+    try:
+        excel_data = _extractors().extract_data_from_excel_bytes(base64.b64decode(file_data['content']))
+        # Round-trip through orjson so pandas timestamps / numpy scalars survive the result backend;
+        # default= is never applied to dict keys, so int/Timestamp column labels need OPT_NON_STR_KEYS
+        excel_data = orjson.loads(orjson.dumps(
+            excel_data, default=str, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        ))
+        return {"file_type": _gst_file_type(filename), "excel_data": excel_data}
+    except Exception as extract_error:
+        logger.warning("Error extracting data from %s: %s", filename, extract_error, extra={'task_id': self.request.id})
+        return {
+            "file_type": filename,
+            "excel_data": {
+                "error": f"Error extracting data: {str(extract_error)}",
+                "summary_text": f"Error reading {filename}",
+                "sheet_names": []
+            }
+        }
+
+
+@celery_app.task(bind=True, base=ProcessingTask, name="tasks.document_processing.aggregate_gst_reports")
+def aggregate_gst_reports(self, file_results: List[Dict]) -> Dict:
+    """
+    Combine per-file GST extractions into one GST report (chord callback)
     
-    finally:
-        # Clean up temporary file
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-                print(f"Cleaned up temporary file: {temp_file_path}")
-            except Exception as e:
-                print(f"Warning: Could not delete temporary file: {e}")
+    Args:
+        file_results: Results of extract_gst_file_task, one per file
+    
+    Returns:
+        Dict with comprehensive GST report
+    """
+    excel_data_dict = {r["file_type"]: r["excel_data"] for r in file_results}
+    logger.info("Generating GST report", extra={'task_id': self.request.id, 'files': len(excel_data_dict)})
+    return _extractors().generate_gst_reports_from_excel(excel_data_dict)
+
+
+@celery_app.task(bind=True, base=ProcessingTask, name="tasks.document_processing.extract_audit_file_task")
+def extract_audit_file_task(self, file_data: Dict) -> Dict:
+    """
+    Extract text from a single audit document (chord header for process_audit_files_task)
+    
+    Args:
+        file_data: File dictionary (same format as process_document_task)
+    
+    Returns:
+        Dict with filename, text and type
+    """
+    filename = file_data['filename']
+    try:
+        text = _extract_text(base64.b64decode(file_data['content']), filename, self.request.id)
+    except Exception as extract_error:
+        logger.warning("Error extracting text from %s: %s", filename, extract_error, extra={'task_id': self.request.id})
+        text = f"Error extracting text: {str(extract_error)}"
+    return {"filename": filename, "text": text, "type": _audit_doc_type(filename)}
+
+
+@celery_app.task(bind=True, base=ProcessingTask, name="tasks.document_processing.aggregate_audit_reports")
+def aggregate_audit_reports(self, file_results: List[Dict]) -> Dict:
+    """
+    Combine per-file audit extractions into one audit report (chord callback)
+    
+    Args:
+        file_results: Results of extract_audit_file_task, one per file
+    
+    Returns:
+        Dict with comprehensive audit report
+    """
+    extracted_texts = {r["type"]: r for r in file_results}
+    logger.info("Generating comprehensive audit report", extra={'task_id': self.request.id, 'files': len(extracted_texts)})
+    return _extractors().generate_comprehensive_audit_report(extracted_texts)
 
 
 @celery_app.task(bind=True, base=ProcessingTask, name="tasks.document_processing.process_gst_files_task")
@@ -270,22 +693,22 @@ def process_gst_files_task(self, files_data: List[Dict]) -> Dict:
     """
     Process multiple GST files asynchronously
     
+    Each file is extracted in parallel as part of a chord; the callback builds
+    the combined GST report once every file is done.
+    
     Args:
         files_data: List of file dictionaries (same format as process_document_task)
     
     Returns:
-        Dict with combined processing results
+        Dict with the chord id to poll for the combined GST report
     """
     task_id = self.request.id
-    print(f"Starting GST files processing task: {task_id}")
-    
-    self.update_state(state='PROCESSING', meta={'status': f'Processing {len(files_data)} files...', 'progress': 0})
+    logger.info("Starting GST files processing task", extra={'task_id': task_id, 'files': len(files_data)})
     
-    # This would process multiple files and combine results
-    # For now, process first file as placeholder
-    # Full implementation would handle all files
+    header = group(extract_gst_file_task.s(f) for f in files_data)
+    result = chord(header)(aggregate_gst_reports.s())
     
-    return {"status": "completed", "files_processed": len(files_data)}
+    return {"status": "queued", "chord_id": result.id, "files_processed": len(files_data)}
 
 
 @celery_app.task(bind=True, base=ProcessingTask, name="tasks.document_processing.process_audit_files_task")
@@ -293,17 +716,19 @@ def process_audit_files_task(self, files_data: List[Dict]) -> Dict:
     """
     Process multiple audit files asynchronously
     
+    Each file is extracted in parallel as part of a chord; the callback builds
+    the comprehensive audit report once every file is done.
+    
     Args:
         files_data: List of file dictionaries
     
     Returns:
-        Dict with comprehensive audit report
+        Dict with the chord id to poll for the comprehensive audit report
     """
     task_id = self.request.id
-    print(f"Starting audit files processing task: {task_id}")
+    logger.info("Starting audit files processing task", extra={'task_id': task_id, 'files': len(files_data)})
     
-    self.update_state(state='PROCESSING', meta={'status': f'Processing {len(files_data)} audit files...', 'progress': 0})
+    header = group(extract_audit_file_task.s(f) for f in files_data)
+    result = chord(header)(aggregate_audit_reports.s())
     
-    # Placeholder - would implement full audit processing
-    return {"status": "completed", "files_processed": len(files_data)}
-
+    return {"status": "queued", "chord_id": result.id, "files_processed": len(files_data)}